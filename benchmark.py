@@ -0,0 +1,189 @@
+"""
+Simple benchmarks for PixelArray.
+
+Usage:
+    python benchmark.py [name ...]
+"""
+import sys
+from threading import Thread
+from time import perf_counter
+
+from pixelarray import PixelArray, Replay, Runner, StreamingRunner
+
+
+def _measure(function, *args):
+    """
+    Run function once and return elapsed seconds
+    :param function: Callable to be measured
+    :param args: Args used to call function
+    """
+    start = perf_counter()
+    function(*args)
+    return perf_counter() - start
+
+
+def benchmark_threads(cols=400, rows=400, max_threads=8, repeat=5):
+    """
+    Measure pixels written per second while several threads draw separated bands
+    :param cols: Number of columns
+    :param rows: Number of rows
+    :param max_threads: Largest number of writer threads
+    :param repeat: Times each thread draws its band
+    """
+    print('threads  pixels/s')
+    number_of_threads = 1
+    while number_of_threads <= max_threads:
+        obj = PixelArray(cols, rows, thread_safe=True)
+        band_height = rows // number_of_threads
+
+        def draw_band(index):
+            y1 = index * band_height + 1
+            for time in range(repeat):
+                obj.draw_rectangle(1, y1, cols, y1 + band_height - 1, str(index % 10))
+
+        def run():
+            threads = [Thread(target=draw_band, args=(index,)) for index in range(number_of_threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        elapsed = _measure(run)
+        pixels = cols * band_height * number_of_threads * repeat
+        print('{:>7}  {:>8.0f}'.format(number_of_threads, pixels / elapsed))
+        number_of_threads *= 2
+
+
+def benchmark_color_stats(cols=300, rows=300, repeat=10):
+    """
+    Compare write heavy drawing with and without color tracking
+    :param cols: Number of columns
+    :param rows: Number of rows
+    :param repeat: Times the whole array is drawn
+    """
+    def draw(obj):
+        for time in range(repeat):
+            color = str(time % 3)
+            obj.draw_rectangle(1, 1, cols, rows // 2, color)
+            for x in range(1, cols + 1, 3):
+                obj.draw_vertical_segment(x, 1, rows, color)
+            obj.fill_region(cols, rows, str(time % 3 + 3))
+
+    untracked = min(_measure(draw, PixelArray(cols, rows, track_colors=False)) for time in range(3))
+    tracked = min(_measure(draw, PixelArray(cols, rows, track_colors=True)) for time in range(3))
+    print('untracked  {:.3f}s'.format(untracked))
+    print('tracked    {:.3f}s  ({:+.0%})'.format(tracked, tracked / untracked - 1))
+
+
+def benchmark_preview(cols=2000, rows=2000, max_width=80, max_height=25):
+    """
+    Compare a full formatted copy of data with small previews, and the cost of keeping preview levels
+    :param cols: Number of columns
+    :param rows: Number of rows
+    :param max_width: Maximum number of columns of the preview
+    :param max_height: Maximum number of rows of the preview
+    """
+    def draw(obj):
+        for index in range(1, 10):
+            obj.draw_rectangle(index * 100, index * 100, cols - index * 100, rows - index * 100, str(index))
+
+    for track_preview in (False, True):
+        obj = PixelArray(cols, rows, track_colors=False, track_preview=track_preview)
+        print('track_preview={}'.format(track_preview))
+        print('  draw                 {:.4f}s'.format(_measure(draw, obj)))
+        print('  get_formatted_data   {:.4f}s'.format(_measure(obj.get_formatted_data)))
+        print('  preview {}x{}        {:.4f}s'.format(
+            max_width, max_height, _measure(obj.get_formatted_preview, max_width, max_height)))
+
+
+def benchmark_replay(number_of_commands=1000000, cols=100, rows=100, seeks=20):
+    """
+    Compare checkpoint settings replaying a long command log: first pass, memory and random seeks
+    :param number_of_commands: Number of commands in the log
+    :param cols: Number of columns
+    :param rows: Number of rows
+    :param seeks: Number of random seeks measured
+    """
+    import random
+
+    generator = random.Random(30)
+    lines = ['I {} {}'.format(cols, rows)]
+    for index in range(number_of_commands - 1):
+        x, y = generator.randint(1, cols), generator.randint(1, rows)
+        if index % 1000 == 999:
+            lines.append('F {} {} {}'.format(x, y, generator.choice('ABC')))
+        elif index % 10 == 9:
+            lines.append('H 1 {} {} {}'.format(x, y, generator.choice('ABC')))
+        else:
+            lines.append('L {} {} {}'.format(x, y, generator.choice('ABC')))
+    steps = [generator.randint(0, number_of_commands) for index in range(seeks)]
+
+    print('setting           first pass  checkpoints  unique rows  seek avg')
+    settings = [('interval', 1000), ('interval', 10000), ('interval', 100000),
+                ('cost', 10 * cols * rows), ('cost', 100 * cols * rows), ('tracked', 1000)]
+    for mode, value in settings:
+        if mode == 'cost':
+            replay = Replay(lines, checkpoint_cost=value)
+        else:
+            replay = Replay(lines, checkpoint_interval=value)
+        if mode == 'tracked':
+            # Same as interval 1000, but paying for color stats like a Runner session after a B command
+            replay._runner._track_colors = True
+
+        first_pass = _measure(replay.seek, number_of_commands)
+        unique_rows = len(set(id(row) for checkpoint in replay._checkpoints if checkpoint
+                              for row in checkpoint[1]))
+        seek = sum(_measure(replay.seek, step) for step in steps) / seeks
+        print('{:<8} {:>8}  {:>9.2f}s  {:>11}  {:>11}  {:>7.4f}s'.format(
+            mode, value, first_pass, len(replay.checkpoint_steps), unique_rows, seek))
+
+
+def benchmark_streaming(cols=1000, rows=1000, number_of_shapes=200):
+    """
+    Compare time and peak memory of StreamingRunner and Runner saving a fill free script
+    :param cols: Number of columns
+    :param rows: Number of rows
+    :param number_of_shapes: Number of drawing commands
+    """
+    import os
+    import random
+    import tracemalloc
+
+    generator = random.Random(31)
+    lines = ['I {} {}'.format(cols, rows)]
+    for index in range(number_of_shapes):
+        x1, x2 = sorted(generator.randint(1, cols) for i in range(2))
+        y1, y2 = sorted(generator.randint(1, rows) for i in range(2))
+        lines.append('K {} {} {} {} {}'.format(x1, y1, x2, y2, generator.choice('ABC')))
+    lines.append('S streaming.bmp')
+
+    def run_in_memory():
+        runner = Runner()
+        for line in lines:
+            command, *command_args = line.split(' ')
+            runner.execute(command, command_args)
+
+    for name, run in (('Runner', run_in_memory), ('StreamingRunner', lambda: StreamingRunner().run_script(lines))):
+        elapsed = _measure(run)
+        # Tracing allocations is slow, so time is measured on a separate run
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('{:<16} {:.2f}s  peak {:.1f} MB'.format(name, elapsed, peak / 2 ** 20))
+    os.remove('streaming.bmp')
+
+
+BENCHMARKS = {
+    'color_stats': benchmark_color_stats,
+    'preview': benchmark_preview,
+    'replay': benchmark_replay,
+    'streaming': benchmark_streaming,
+    'threads': benchmark_threads,
+}
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or sorted(BENCHMARKS):
+        print('== {} =='.format(name))
+        BENCHMARKS[name]()
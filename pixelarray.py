@@ -1,16 +1,463 @@
+from bisect import bisect_right, insort
+from collections import Counter
+from contextlib import contextmanager
+from threading import Event, Lock, RLock
+from time import monotonic
+
+
+class FillInterrupted(Exception):
+    """Raised when fill_region stops before the whole region is filled"""
+    reason_phrases = {'budget': 'pixel budget', 'deadline': 'deadline', 'cancelled': 'cancellation'}
+
+    def __init__(self, reason, filled_pixels, rolled_back=False):
+        """
+        Initialize FillInterrupted exception
+        :param reason: Why the fill stopped: 'budget', 'deadline' or 'cancelled'
+        :param filled_pixels: Number of pixels filled before stopping
+        :param rolled_back: True if the filled pixels were restored to the region color
+        """
+        super().__init__(reason, filled_pixels, rolled_back)
+        self.reason = reason
+        self.filled_pixels = filled_pixels
+        self.rolled_back = rolled_back
+
+    def __str__(self):
+        state = 'changes were rolled back' if self.rolled_back else 'region was partially filled'
+        return 'Fill stopped by {} after {} pixels, {}.'.format(
+            self.reason_phrases[self.reason], self.filled_pixels, state)
+
+
+class _FillGuard:
+    """Keeps a bounded fill under its pixel budget, deadline and cancellation token"""
+    check_interval = 1024
+
+    def __init__(self, max_pixels=None, timeout=None, cancel=None, progress=None, record=True):
+        """
+        Initialize _FillGuard object
+        :param max_pixels: Maximum number of pixels to be filled
+        :param timeout: Maximum number of seconds the fill may take
+        :param cancel: Object with is_set method, like threading.Event. When set, the fill stops.
+        :param progress: Callable receiving the number of filled pixels, called periodically
+        :param record: If True, keeps filled pixels so they can be rolled back
+        """
+        self.max_pixels = max_pixels
+        self.deadline = None if timeout is None else monotonic() + timeout
+        self.cancel = cancel
+        self.progress = progress
+        self.filled_pixels = 0
+        self.filled = [] if record else None
+
+    def step(self, x, y):
+        """
+        Account a pixel that is about to be filled
+        :param x: Column of the pixel
+        :param y: Line of the pixel
+        :raise FillInterrupted: If the fill must stop before this pixel
+        """
+        if self.max_pixels is not None and self.filled_pixels >= self.max_pixels:
+            raise FillInterrupted('budget', self.filled_pixels)
+        if self.filled_pixels % self.check_interval == 0:
+            self._check()
+
+        self.filled_pixels += 1
+        if self.filled is not None:
+            self.filled.append((x, y))
+
+    def _check(self):
+        """Verify the deadline and the cancellation token, and report progress"""
+        if self.cancel is not None and self.cancel.is_set():
+            raise FillInterrupted('cancelled', self.filled_pixels)
+        if self.deadline is not None and monotonic() > self.deadline:
+            raise FillInterrupted('deadline', self.filled_pixels)
+        self.report()
+
+    def report(self):
+        """Report progress, if there is a callback"""
+        if self.progress is not None:
+            self.progress(self.filled_pixels)
+
+
+class _ColorStats:
+    """
+    Keeps the number of pixels and the bounding box of each color, updated on every write.
+        Each color counts its pixels by line and by column. The bounding box is kept as an outer bound
+        that grows on writes and is shrunk back, lazily, on query.
+    """
+    def __init__(self, number_of_cols, number_of_rows, color='0'):
+        """
+        Initialize _ColorStats object for an array filled with one color
+        :param number_of_cols: Number of columns
+        :param number_of_rows: Number of rows
+        :param color: Color of all pixels
+        """
+        self.histogram = {}
+        self._rows = {}
+        self._cols = {}
+        self._boxes = {}
+        if number_of_cols > 0 and number_of_rows > 0:
+            self.histogram[color] = number_of_cols * number_of_rows
+            self._rows[color] = dict.fromkeys(range(1, number_of_rows + 1), number_of_cols)
+            self._cols[color] = dict.fromkeys(range(1, number_of_cols + 1), number_of_rows)
+            self._boxes[color] = [1, 1, number_of_cols, number_of_rows]
+
+    def move(self, x, y, old_color, color):
+        """
+        Account a pixel changing from old_color to color
+        :param x: Column of the pixel
+        :param y: Line of the pixel
+        :param old_color: Previous color
+        :param color: New color
+        """
+        histogram = self.histogram
+        count = histogram.get(old_color, 0) - 1
+        if count > 0:
+            histogram[old_color] = count
+            rows, cols = self._rows[old_color], self._cols[old_color]
+            count = rows[y] - 1
+            if count:
+                rows[y] = count
+            else:
+                del rows[y]
+            count = cols[x] - 1
+            if count:
+                cols[x] = count
+            else:
+                del cols[x]
+        elif count == 0:
+            del histogram[old_color], self._rows[old_color], self._cols[old_color], self._boxes[old_color]
+
+        box = self._boxes.get(color)
+        if box is None:
+            histogram[color] = 1
+            self._rows[color] = {y: 1}
+            self._cols[color] = {x: 1}
+            self._boxes[color] = [x, y, x, y]
+            return
+
+        histogram[color] += 1
+        rows, cols = self._rows[color], self._cols[color]
+        rows[y] = rows.get(y, 0) + 1
+        cols[x] = cols.get(x, 0) + 1
+        if x < box[0]:
+            box[0] = x
+        elif x > box[2]:
+            box[2] = x
+        if y < box[1]:
+            box[1] = y
+        elif y > box[3]:
+            box[3] = y
+
+    def remove_rectangle(self, x1, y1, old_rows):
+        """
+        Account pixels of a rectangle that are about to be overwritten
+        :param x1: Column of the top left pixel
+        :param y1: Line of the top left pixel
+        :param old_rows: Previous colors, one list for each line from y1 onwards
+        """
+        histogram = self.histogram
+        touched_colors = set()
+        for x, old_colors in enumerate(zip(*old_rows), x1):
+            for old_color, count in self._tally(old_colors):
+                if old_color in histogram:
+                    self._discount(self._cols[old_color], x, count)
+                    touched_colors.add(old_color)
+
+        if len(touched_colors) == 1 and old_rows[0][0] in histogram:
+            # Only one color was overwritten, every line lost all its pixels to the new color
+            old_color, width = old_rows[0][0], len(old_rows[0])
+            histogram[old_color] -= width * len(old_rows)
+            rows = self._rows[old_color]
+            for y in range(y1, y1 + len(old_rows)):
+                self._discount(rows, y, width)
+        elif len(old_rows[0]) == 1:
+            for y, (old_color,) in enumerate(old_rows, y1):
+                if old_color in histogram:
+                    histogram[old_color] -= 1
+                    self._discount(self._rows[old_color], y, 1)
+        else:
+            for y, old_colors in enumerate(old_rows, y1):
+                for old_color, count in self._tally(old_colors):
+                    if old_color in histogram:
+                        histogram[old_color] -= count
+                        self._discount(self._rows[old_color], y, count)
+
+        for old_color in touched_colors:
+            if histogram[old_color] <= 0:
+                del histogram[old_color], self._rows[old_color], self._cols[old_color], self._boxes[old_color]
+
+    def paint_column(self, x, y1, old_colors, color):
+        """
+        Account pixels of a single column that changed to color, walking the column once
+        :param x: Column of the pixels
+        :param y1: Line of the first pixel
+        :param old_colors: Previous colors, one for each line from y1 onwards
+        :param color: New color
+        """
+        histogram = self.histogram
+        if color not in histogram:
+            histogram[color] = 0
+            self._rows[color], self._cols[color] = {}, {}
+            self._boxes[color] = [x, y1, x, y1]
+        new_rows = self._rows[color]
+        previous_color, rows = color, None
+        for y, old_color in enumerate(old_colors, y1):
+            if old_color != previous_color:
+                # Lines usually come in runs of one color, so the run keeps its line counts at hand
+                previous_color = old_color
+                rows = self._rows.get(old_color) if old_color != color else None
+            if rows is None:
+                continue
+            count = rows[y] - 1
+            if count:
+                rows[y] = count
+            else:
+                del rows[y]
+            new_rows[y] = new_rows.get(y, 0) + 1
+
+        added = 0
+        for old_color, count in self._tally(old_colors):
+            if old_color == color or old_color not in histogram:
+                continue
+            added += count
+            histogram[old_color] -= count
+            if histogram[old_color] <= 0:
+                del histogram[old_color], self._rows[old_color], self._cols[old_color], self._boxes[old_color]
+            else:
+                self._discount(self._cols[old_color], x, count)
+        if not added:
+            if not histogram[color]:
+                del histogram[color], self._rows[color], self._cols[color], self._boxes[color]
+            return
+
+        histogram[color] += added
+        cols = self._cols[color]
+        cols[x] = cols.get(x, 0) + added
+        box = self._boxes[color]
+        y2 = y1 + len(old_colors) - 1
+        box[0], box[1] = min(box[0], x), min(box[1], y1)
+        box[2], box[3] = max(box[2], x), max(box[3], y2)
+
+    @staticmethod
+    def _tally(colors):
+        """
+        Count pixels of each color, with a fast path for a single color
+        :param colors: Sequence of colors
+        :return: Iterable of (color, number of pixels)
+        """
+        if not colors:
+            return ()
+        first_color = colors[0]
+        if colors.count(first_color) == len(colors):
+            return ((first_color, len(colors)),)
+        return Counter(colors).items()
+
+    @staticmethod
+    def _discount(counts, key, pixels):
+        """
+        Decrement pixels from a line or column count
+        :param counts: Pixels by line or by column
+        :param key: The line or column
+        :param pixels: Number of pixels removed
+        """
+        count = counts.get(key, 0) - pixels
+        if count > 0:
+            counts[key] = count
+        else:
+            counts.pop(key, None)
+
+    def add_rectangle(self, x1, y1, x2, y2, color):
+        """
+        Account pixels from (x1, y1) to (x2, y2) that were colored
+        :param x1: Column of the first pixel
+        :param y1: Line of the first pixel
+        :param x2: Column of the second pixel
+        :param y2: Line of the second pixel
+        :param color: New color
+        """
+        width, height = x2 - x1 + 1, y2 - y1 + 1
+        box = self._boxes.get(color)
+        if box is None:
+            self.histogram[color] = width * height
+            self._rows[color] = dict.fromkeys(range(y1, y2 + 1), width)
+            self._cols[color] = dict.fromkeys(range(x1, x2 + 1), height)
+            self._boxes[color] = [x1, y1, x2, y2]
+            return
+
+        self.histogram[color] += width * height
+        rows = self._rows[color]
+        for y in range(y1, y2 + 1):
+            rows[y] = rows.get(y, 0) + width
+        cols = self._cols[color]
+        for x in range(x1, x2 + 1):
+            cols[x] = cols.get(x, 0) + height
+        box[0], box[1] = min(box[0], x1), min(box[1], y1)
+        box[2], box[3] = max(box[2], x2), max(box[3], y2)
+
+    def add_rows(self, x1, y1, new_rows):
+        """
+        Account pixels of a rectangle that were colored
+        :param x1: Column of the top left pixel
+        :param y1: Line of the top left pixel
+        :param new_rows: New colors, one list for each line from y1 onwards
+        """
+        histogram = self.histogram
+        touched_colors = set()
+        for y, colors in enumerate(new_rows, y1):
+            for color, count in self._tally(colors):
+                if color not in histogram:
+                    histogram[color] = 0
+                    self._rows[color], self._cols[color] = {}, {}
+                histogram[color] += count
+                rows = self._rows[color]
+                rows[y] = rows.get(y, 0) + count
+                touched_colors.add(color)
+
+        for x, colors in enumerate(zip(*new_rows), x1):
+            for color, count in self._tally(colors):
+                cols = self._cols[color]
+                cols[x] = cols.get(x, 0) + count
+
+        for color in touched_colors:
+            rows, cols = self._rows[color], self._cols[color]
+            box = self._boxes.setdefault(color, [min(cols), min(rows), max(cols), max(rows)])
+            box[0], box[1] = min(box[0], min(cols)), min(box[1], min(rows))
+            box[2], box[3] = max(box[2], max(cols)), max(box[3], max(rows))
+
+    def bounding_box(self, color):
+        """
+        Return the bounding box of a color
+        :param color: The color
+        :return: Tuple (x1, y1, x2, y2), or None if no pixel has this color
+        """
+        box = self._boxes.get(color)
+        if box is None:
+            return None
+
+        rows, cols = self._rows[color], self._cols[color]
+        while box[0] not in cols:
+            box[0] += 1
+        while box[2] not in cols:
+            box[2] -= 1
+        while box[1] not in rows:
+            box[1] += 1
+        while box[3] not in rows:
+            box[3] -= 1
+        return tuple(box)
+
+
+class _PreviewPyramid:
+    """
+    Keeps downsampled copies of data, each level with half the size of the previous one.
+        Each pixel of a level holds the majority color of its 2x2 block in the level below,
+        ties going to the first pixel of the block, in reading order.
+    """
+    def __init__(self, number_of_cols, number_of_rows, color='0'):
+        """
+        Initialize _PreviewPyramid object for an array filled with one color
+        :param number_of_cols: Number of columns
+        :param number_of_rows: Number of rows
+        :param color: Color of all pixels
+        """
+        self.levels = []
+        while number_of_cols > 1 or number_of_rows > 1:
+            number_of_cols, number_of_rows = -(-number_of_cols // 2), -(-number_of_rows // 2)
+            self.levels.append([[color] * number_of_cols for row in range(number_of_rows)])
+
+    def update(self, data, x1, y1, x2, y2):
+        """
+        Recompute every block holding pixels from (x1, y1) to (x2, y2)
+        :param data: Rows of the array, already changed
+        :param x1: Column of the first pixel
+        :param y1: Line of the first pixel
+        :param x2: Column of the second pixel
+        :param y2: Line of the second pixel
+        """
+        if x1 > x2 or y1 > y2:
+            # Arrays without columns or lines have no block to update
+            return
+        source = data
+        col1, row1, col2, row2 = x1 - 1, y1 - 1, x2 - 1, y2 - 1
+        for level in self.levels:
+            col1, row1, col2, row2 = col1 // 2, row1 // 2, col2 // 2, row2 // 2
+            for row in range(row1, row2 + 1):
+                top = source[2 * row]
+                bottom = source[2 * row + 1] if 2 * row + 1 < len(source) else []
+                level_row = level[row]
+                self._update_block(level_row, top, bottom, col1)
+                if col2 > col1:
+                    self._update_block(level_row, top, bottom, col2)
+                if col2 - col1 < 2:
+                    continue
+
+                # Blocks between the first and the last one are often of a single color
+                top_span = top[2 * col1 + 2:2 * col2]
+                first_color = top_span[0]
+                if top_span.count(first_color) == len(top_span) and \
+                        (not bottom or bottom[2 * col1 + 2:2 * col2].count(first_color) == len(top_span)):
+                    level_row[col1 + 1:col2] = [first_color] * (col2 - col1 - 1)
+                else:
+                    for col in range(col1 + 1, col2):
+                        self._update_block(level_row, top, bottom, col)
+            source = level
+
+    @staticmethod
+    def _update_block(level_row, top, bottom, col):
+        """
+        Recompute the majority color of a 2x2 block
+        :param level_row: Line of the level being updated
+        :param top: Upper line of the level below
+        :param bottom: Lower line of the level below, empty if there is none
+        :param col: Column of the block in level_row
+        """
+        block = top[2 * col:2 * col + 2] + bottom[2 * col:2 * col + 2]
+        first_color = block[0]
+        if block.count(first_color) == len(block):
+            level_row[col] = first_color
+        else:
+            level_row[col] = max(block, key=block.count)
+
+
+class _NoLock:
+    """Context manager that does nothing, used when PixelArray is not thread safe"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_LOCK = _NoLock()
+
+
 class PixelArray:
     """Implements a array of pixels"""
-    def __init__(self, number_of_cols, number_of_rows, fill_strategy_recursive=False):
+    # Recursive fills that could go deeper than this fall back to the iterative strategy
+    recursive_fill_limit = 10000
+
+    def __init__(self, number_of_cols, number_of_rows, fill_strategy_recursive=False,
+                 thread_safe=False, rows_per_lock=16, track_colors=False, track_preview=False):
         """
         Initializer a PixelArray object
         :param number_of_cols: Number of columns
         :param number_of_rows: Number of rows
         :param fill_strategy_recursive: Strategy used to fill pixel area. True, will use recursive one.
+        :param thread_safe: If True, writes are synchronized with one lock per stripe of rows.
+        :param rows_per_lock: Height of each locked stripe of rows, used only when thread_safe is True.
+        :param track_colors: If True, keeps the histogram and bounding boxes of colors updated on every write.
+            It can also be turned on later with enable_color_tracking.
+        :param track_preview: If True, keeps downsampled levels updated on every write, used by previews.
+
+        pixels_written counts every pixel changed since initialization, it is approximate when
+        several threads write at the same time.
         """
         self.number_of_rows = number_of_rows
         self.number_of_cols = number_of_cols
+        self._track_colors = track_colors
+        self._track_preview = track_preview
+        self.pixels_written = 0
         self._initialize_data(number_of_cols, number_of_rows)
         self._fill_strategy_recursive = fill_strategy_recursive
+        self._initialize_locks(number_of_rows, thread_safe, rows_per_lock)
 
     def __len__(self):
         return self.number_of_rows * self.number_of_cols
@@ -24,10 +471,94 @@ class PixelArray:
         self._data = []
         for row in range(number_of_rows):
             self._data.append(list(['0' for col in range(number_of_cols)]))
+        self.pixels_written += number_of_cols * number_of_rows
+        self._color_stats = _ColorStats(number_of_cols, number_of_rows) if self._track_colors else None
+        self._preview = _PreviewPyramid(number_of_cols, number_of_rows) if self._track_preview else None
+
+    def _initialize_locks(self, number_of_rows, thread_safe, rows_per_lock):
+        """
+        Create one lock for each stripe of rows
+        :param number_of_rows: Number of rows
+        :param thread_safe: If False, no lock is created
+        :param rows_per_lock: Height of each stripe
+        """
+        self._rows_per_lock = rows_per_lock
+        self._locks = None
+        self._tracking_lock = None
+        if thread_safe:
+            if rows_per_lock <= 0:
+                raise ValueError('Rows per lock must be a positive number')
+            number_of_stripes = max(1, -(-number_of_rows // rows_per_lock))
+            self._locks = [RLock() for stripe in range(number_of_stripes)]
+            # Color stats and preview levels are shared by all stripes
+            self._tracking_lock = Lock()
+
+    @property
+    def thread_safe(self):
+        return self._locks is not None
+
+    def _lock_rows(self, y1, y2):
+        """
+        Hold the locks of every stripe touched by lines y1 to y2.
+            Locks are always taken from top to bottom, so writers can not deadlock each other.
+        :param y1: From this line
+        :param y2: To this line
+        :return: Context manager holding the locks, a shared no-op one when not thread safe
+        """
+        if self._locks is None:
+            return _NO_LOCK
+        return self._hold_stripes(y1, y2)
+
+    @contextmanager
+    def _hold_stripes(self, y1, y2):
+        """
+        Hold the locks of every stripe touched by lines y1 to y2
+        :param y1: From this line
+        :param y2: To this line
+        """
+        last_stripe = len(self._locks) - 1
+        first = min(max((min(y1, y2) - 1) // self._rows_per_lock, 0), last_stripe)
+        last = min(max((max(y1, y2) - 1) // self._rows_per_lock, 0), last_stripe)
+        locks = self._locks[first:last + 1]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _lock_all(self):
+        """Hold the locks of all rows, giving a consistent view of the whole array"""
+        return self._lock_rows(1, self.number_of_rows)
 
     def clear(self):
         """Clear the data."""
-        self._initialize_data(self.number_of_cols, self.number_of_rows)
+        with self._lock_all():
+            self._initialize_data(self.number_of_cols, self.number_of_rows)
+
+    def snapshot(self):
+        """Returns a consistent copy of data"""
+        with self._lock_all():
+            return [list(row) for row in self._data]
+
+    def restore(self, rows):
+        """
+        Replace data with a copy of rows, like the ones returned by snapshot
+        :param rows: One sequence of colors for each line
+        """
+        if len(rows) != self.number_of_rows or any(len(row) != self.number_of_cols for row in rows):
+            raise ValueError('Rows must have the size of the array')
+
+        with self._lock_all():
+            self._data = [list(row) for row in rows]
+            self.pixels_written += len(self)
+            if self._color_stats is not None:
+                self._color_stats = _ColorStats(0, 0)
+                self._color_stats.add_rows(1, 1, self._data)
+            if self._preview is not None:
+                self._preview = _PreviewPyramid(self.number_of_cols, self.number_of_rows)
+                self._preview.update(self._data, 1, 1, self.number_of_cols, self.number_of_rows)
 
     @property
     def data(self):
@@ -72,18 +603,116 @@ class PixelArray:
         :param y: Line of the pixel
         :param color: New color
         """
+        if self._locks is None:
+            return self._colorize(x, y, color)
+        with self._lock_rows(y, y):
+            self._colorize(x, y, color)
+
+    def _colorize(self, x, y, color):
+        """
+        Change color of a pixel, without taking any lock
+        :param x: Column of the pixel
+        :param y: Line of the pixel
+        :param color: New color
+        """
         self._verify_coordinates(x, y)
-        self._data[y-1][x-1] = color
+        row = self._data[y-1]
+        old_color = row[x-1]
+        row[x-1] = color
+        self.pixels_written += 1
+        if old_color != color:
+            if self._color_stats is not None:
+                self._update_tracking(self._color_stats.move, x, y, old_color, color)
+            if self._preview is not None:
+                self._update_tracking(self._preview.update, self._data, x, y, x, y)
+
+    def _verify_track_colors(self):
+        """Raise a ValueError if colors are not tracked"""
+        if self._color_stats is None:
+            raise ValueError('Colors are not tracked, call enable_color_tracking first')
+
+    def enable_color_tracking(self):
+        """Start keeping the histogram and bounding boxes of colors, counting the current data once"""
+        with self._lock_all():
+            if self._color_stats is None:
+                self._track_colors = True
+                self._color_stats = _ColorStats(0, 0)
+                self._color_stats.add_rows(1, 1, self._data)
+
+    def color_histogram(self):
+        """
+        Return the number of pixels of each color
+        :return: Dict mapping color to number of pixels
+        """
+        self._verify_track_colors()
+        with self._lock_all():
+            return dict(self._color_stats.histogram)
+
+    def color_count(self, color):
+        """
+        Return the number of pixels of a color
+        :param color: The color
+        :return: Number of pixels
+        """
+        self._verify_track_colors()
+        return self._color_stats.histogram.get(color, 0)
+
+    def bounding_box(self, color):
+        """
+        Return the smallest rectangle holding all pixels of a color
+        :param color: The color
+        :return: Tuple (x1, y1, x2, y2), or None if no pixel has this color
+        """
+        self._verify_track_colors()
+        with self._lock_all():
+            return self._color_stats.bounding_box(color)
 
     def get_formatted_data(self):
         """Returns data with pretty format"""
-        formatted_data = ''
-        for row in self.data:
-            for col in row:
-                formatted_data += col
-            formatted_data += '\n'
+        with self._lock_all():
+            return self._format_data()
+
+    def _format_data(self):
+        """Returns data with pretty format, without taking any lock"""
+        return ''.join(''.join(row) + '\n' for row in self._data)
+
+    def get_formatted_preview(self, max_width, max_height):
+        """
+        Returns a downsampled copy of data with pretty format, at most max_width by max_height pixels.
+            Each pixel of the preview stands for a square block of data, the smallest power of two that fits.
+            Blocks hold the majority color when initialized with track_preview=True, the top left color otherwise.
+        :param max_width: Maximum number of columns of the preview
+        :param max_height: Maximum number of rows of the preview
+        """
+        if max_width <= 0 or max_height <= 0:
+            raise ValueError('Preview size must be a positive number')
+
+        with self._lock_all():
+            level, cols, rows = 0, self.number_of_cols, self.number_of_rows
+            while cols > max_width or rows > max_height:
+                level, cols, rows = level + 1, -(-cols // 2), -(-rows // 2)
+
+            if level == 0:
+                preview = self._data
+            elif self._preview is not None:
+                preview = self._preview.levels[level - 1]
+            else:
+                step = 2 ** level
+                preview = [row[::step] for row in self._data[::step]]
 
-        return formatted_data
+            return ''.join(''.join(row) + '\n' for row in preview)
+
+    def save_preview(self, name, max_width, max_height):
+        """
+        Save formatted preview to file
+        :param name: Name of the file
+        :param max_width: Maximum number of columns of the preview
+        :param max_height: Maximum number of rows of the preview
+        """
+        formatted_preview = self.get_formatted_preview(max_width, max_height)
+        file = open(name, 'w')
+        file.write(formatted_preview)
+        file.close()
 
     def draw_vertical_segment(self, x, y1, y2, color):
         """
@@ -93,8 +722,8 @@ class PixelArray:
         :param y2: To this line
         :param color: Whit this color
         """
-        for y in range(y1, y2+1):
-            self.colorize(x, y, color)
+        with self._lock_rows(y1, y2):
+            self._paint_rectangle(x, y1, x, y2, color)
 
     def draw_horizontal_segment(self, x1, x2, y, color):
         """
@@ -104,8 +733,8 @@ class PixelArray:
         :param y: In this line
         :param color: Whit this color
         """
-        for x in range(x1, x2+1):
-            self.colorize(x, y, color)
+        with self._lock_rows(y, y):
+            self._paint_rectangle(x1, y, x2, y, color)
 
     def draw_rectangle(self, x1, y1, x2, y2, color):
         """
@@ -116,9 +745,59 @@ class PixelArray:
         :param y2: Line of the second pixel
         :param color: Color to fill the rectangle
         """
-        for x in range(x1, x2+1):
-            for y in range(y1, y2+1):
-                self.colorize(x, y, color)
+        with self._lock_rows(y1, y2):
+            self._paint_rectangle(x1, y1, x2, y2, color)
+
+    def _paint_rectangle(self, x1, y1, x2, y2, color):
+        """
+        Change color of all pixels from (x1, y1) to (x2, y2), without taking any lock.
+            Both corners are verified before any pixel is changed.
+        :param x1: Column of the first pixel
+        :param y1: Line of the first pixel
+        :param x2: Column of the second pixel
+        :param y2: Line of the second pixel
+        :param color: New color
+        """
+        if x1 > x2 or y1 > y2:
+            return
+        self._verify_coordinates(x1, y1)
+        self._verify_coordinates(x2, y2)
+
+        rows = self._data[y1-1:y2]
+        if x1 == x2:
+            # Vertical segments walk the column once, instead of slicing every line
+            index = x1 - 1
+            if self._color_stats is not None:
+                old_colors = [row[index] for row in rows]
+            for row in rows:
+                row[index] = color
+            self.pixels_written += len(rows)
+            if self._color_stats is not None:
+                self._update_tracking(self._color_stats.paint_column, x1, y1, old_colors, color)
+        else:
+            span = [color] * (x2 - x1 + 1)
+            if self._color_stats is not None:
+                old_rows = [row[x1-1:x2] for row in rows]
+            for row in rows:
+                row[x1-1:x2] = span
+            self.pixels_written += len(span) * len(rows)
+            if self._color_stats is not None:
+                self._update_tracking(self._color_stats.remove_rectangle, x1, y1, old_rows)
+                self._update_tracking(self._color_stats.add_rectangle, x1, y1, x2, y2, color)
+        if self._preview is not None:
+            self._update_tracking(self._preview.update, self._data, x1, y1, x2, y2)
+
+    def _update_tracking(self, method, *args):
+        """
+        Call a _ColorStats or _PreviewPyramid method, holding their lock when thread safe
+        :param method: _ColorStats or _PreviewPyramid method
+        :param args: Args used to call method
+        """
+        if self._tracking_lock is None:
+            method(*args)
+        else:
+            with self._tracking_lock:
+                method(*args)
 
     def _can_fill_pixel(self, x, y, region_color):
         """
@@ -128,9 +807,9 @@ class PixelArray:
         :param region_color: The region color that will be verified
         :return: True if can be changed
         """
-        return self._verify_coordinates(x, y, False) and self.get_pixel(x, y) == region_color
+        return self._verify_coordinates(x, y, False) and self._data[y-1][x-1] == region_color
 
-    def _fill(self, x, y, region_color, color):
+    def _fill(self, x, y, region_color, color, guard=None):
         """
         Fill all pixel located in same region color, and his adjacent pixels.
             Algorithm: FloodFill with iterative implementation.
@@ -140,6 +819,7 @@ class PixelArray:
         :param y: Line of the pixel
         :param region_color: The region color that will be verified
         :param color: New color
+        :param guard: Optional _FillGuard bounding the fill
         """
         pixels_to_fill = set()
         if self._can_fill_pixel(x, y, region_color):
@@ -147,7 +827,9 @@ class PixelArray:
 
         while pixels_to_fill:
             x, y = pixels_to_fill.pop()
-            self.colorize(x, y, color)
+            if guard is not None:
+                guard.step(x, y)
+            self._colorize(x, y, color)
 
             if self._can_fill_pixel(x - 1, y, region_color):
                 pixels_to_fill.add((x - 1, y))
@@ -158,7 +840,7 @@ class PixelArray:
             if self._can_fill_pixel(x, y + 1, region_color):
                 pixels_to_fill.add((x, y + 1))
 
-    def _fill_recursive(self, x, y, region_color, color):
+    def _fill_recursive(self, x, y, region_color, color, guard=None):
         """
         Fill all pixel located in same region color, and his adjacent pixels.
             Algorithm: FloodFill with recursive implementation
@@ -166,65 +848,139 @@ class PixelArray:
         :param y: Line of the pixel
         :param region_color: The region color that will be verified
         :param color: New color
+        :param guard: Optional _FillGuard bounding the fill
         """
-        if self.get_pixel(x, y) == region_color:
-            self.colorize(x, y, color)
+        if self._data[y-1][x-1] == region_color:
+            if guard is not None:
+                guard.step(x, y)
+            self._colorize(x, y, color)
 
         if self._can_fill_pixel(x, y - 1, region_color):
-            self._fill_recursive(x, y - 1, region_color, color)
+            self._fill_recursive(x, y - 1, region_color, color, guard)
 
         if self._can_fill_pixel(x, y + 1, region_color):
-            self._fill_recursive(x, y + 1, region_color, color)
+            self._fill_recursive(x, y + 1, region_color, color, guard)
 
         if self._can_fill_pixel(x + 1, y, region_color):
-            self._fill_recursive(x + 1, y, region_color, color)
+            self._fill_recursive(x + 1, y, region_color, color, guard)
 
         if self._can_fill_pixel(x - 1, y, region_color):
-            self._fill_recursive(x - 1, y, region_color, color)
+            self._fill_recursive(x - 1, y, region_color, color, guard)
 
-    def fill_region(self, x, y, color):
+    @staticmethod
+    def _stack_depth():
+        """Returns the number of frames in the current stack"""
+        import sys
+
+        depth, frame = 0, sys._getframe()
+        while frame is not None:
+            depth, frame = depth + 1, frame.f_back
+        return depth
+
+    def fill_region(self, x, y, color, max_pixels=None, timeout=None, cancel=None, progress=None,
+                    rollback=True):
         """
         Fill region with new color
+            The recursive strategy is used only when the array, or max_pixels, is within
+            recursive_fill_limit pixels. Larger fills use the iterative one.
         :param x: Column of the pixel in region
         :param y: Line of the pixel in region
         :param color: New color
+        :param max_pixels: Optional maximum number of pixels to be filled
+        :param timeout: Optional maximum number of seconds the fill may take
+        :param cancel: Optional object with is_set method, like threading.Event. When set, the fill stops.
+        :param progress: Optional callable receiving the number of filled pixels, called periodically
+        :param rollback: If True, an interrupted fill restores the pixels it has already filled
+        :raise FillInterrupted: If any limit is reached before the whole region is filled
         """
         import sys
 
-        region_color = self.get_pixel(x, y)
-        if self._fill_strategy_recursive:
-            default_recursion_limit = sys.getrecursionlimit()
-            sys.setrecursionlimit(len(self) + 100)
+        guard = None
+        if max_pixels is not None or timeout is not None or cancel is not None or progress is not None:
+            guard = _FillGuard(max_pixels, timeout, cancel, progress, record=rollback)
 
-            self._fill_recursive(x, y, region_color, color)
+        with self._lock_all():
+            region_color = self.get_pixel(x, y)
+            if region_color == color:
+                return
 
-            sys.setrecursionlimit(default_recursion_limit)
-        else:
-            self._fill(x, y, region_color, color)
+            # Each recursive call fills one pixel, so the region size, or the pixel budget, bounds the depth
+            recursion_depth = len(self) if max_pixels is None else min(len(self), max_pixels)
+            try:
+                if self._fill_strategy_recursive and recursion_depth <= self.recursive_fill_limit:
+                    default_recursion_limit = sys.getrecursionlimit()
+                    sys.setrecursionlimit(max(default_recursion_limit,
+                                              self._stack_depth() + recursion_depth + 100))
+                    try:
+                        self._fill_recursive(x, y, region_color, color, guard)
+                    finally:
+                        sys.setrecursionlimit(default_recursion_limit)
+                else:
+                    self._fill(x, y, region_color, color, guard)
+            except FillInterrupted as error:
+                if rollback:
+                    for filled_x, filled_y in guard.filled:
+                        self._colorize(filled_x, filled_y, region_color)
+                    error.rolled_back = True
+                raise
+
+            if guard is not None:
+                guard.report()
 
     def save(self, name):
         """
         Save formatted data to file
         :param name: Name of the file
         """
+        formatted_data = self.get_formatted_data()
         file = open(name, 'w')
-        file.write(self.get_formatted_data())
+        file.write(formatted_data)
         file.close()
 
 
 class Runner:
-    def __init__(self, fill_strategy_recursive=False):
+    def __init__(self, fill_strategy_recursive=False, fill_max_pixels=None, fill_timeout=None,
+                 fill_rollback=True, track_preview=False, track_colors=False):
         """
         Initialize Runner object
         :param fill_strategy_recursive: Strategy used to fill pixel area. True, will use recursive one.
+        :param fill_max_pixels: Optional maximum number of pixels filled by each F command
+        :param fill_timeout: Optional maximum number of seconds taken by each F command
+        :param fill_rollback: If True, an F command stopped by fill_max_pixels or fill_timeout leaves the
+            array untouched. A cancelled F command without limits leaves the region partially filled.
+        :param track_preview: If True, previews show the majority color of each block
+        :param track_colors: If True, arrays track colors from the start. The B command turns it on.
         """
         self._data = None
         self._fill_strategy_recursive = fill_strategy_recursive
+        self.fill_max_pixels = fill_max_pixels
+        self.fill_timeout = fill_timeout
+        self.fill_rollback = fill_rollback
+        self._track_preview = track_preview
+        self._track_colors = track_colors
+        self._fill_cancel = Event()
+
+    def cancel_fill(self):
+        """Stop the F command running in another thread, or the next one if none is running"""
+        self._fill_cancel.set()
 
     @staticmethod
     def _print_error(error_message):
         print(error_message)
 
+    @staticmethod
+    def _print_output(output):
+        print(output)
+
+    def _new_pixelarray(self, number_of_cols, number_of_rows):
+        """
+        Create a PixelArray object with this Runner settings
+        :param number_of_cols: Number of columns
+        :param number_of_rows: Number of rows
+        """
+        return PixelArray(number_of_cols, number_of_rows, self._fill_strategy_recursive,
+                          track_colors=self._track_colors, track_preview=self._track_preview)
+
     def execute_i(self, args):
         """
         Create a empty array of pixels
@@ -233,7 +989,7 @@ class Runner:
         try:
             cols = int(args[0])
             rows = int(args[1])
-            self._data = PixelArray(cols, rows, self._fill_strategy_recursive)
+            self._data = self._new_pixelarray(cols, rows)
         except IndexError:
             self._print_error('Invalid command! Must be: i number_of_columns number_of_rows')
 
@@ -320,12 +1076,32 @@ class Runner:
             x = int(args[0])
             y = int(args[1])
             color = str(args[2])
-            self._data.fill_region(x, y, color)
+            # Rolling back keeps every filled pixel, so unbounded fills only report a cancellation
+            limited = self.fill_max_pixels is not None or self.fill_timeout is not None
+            try:
+                self._data.fill_region(x, y, color, max_pixels=self.fill_max_pixels, timeout=self.fill_timeout,
+                                       cancel=self._fill_cancel, rollback=self.fill_rollback and limited)
+            finally:
+                self._fill_cancel.clear()
         except AttributeError:
             self._print_error('Invalid command! Must be initialized first.')
+        except FillInterrupted as error:
+            self._print_error(str(error))
         except IndexError:
             self._print_error('Invalid command! Must be: f Pos_X Pos_Y Color')
 
+    def execute_t(self, args):
+        """
+        Set the limits of F commands, - means no limit
+        :param args: Args used in this command
+        """
+        try:
+            max_pixels, timeout = str(args[0]), str(args[1])
+            self.fill_max_pixels = None if max_pixels == '-' else int(max_pixels)
+            self.fill_timeout = None if timeout == '-' else float(timeout)
+        except IndexError:
+            self._print_error('Invalid command! Must be: T Max_Pixels Max_Seconds')
+
     def execute_s(self, args):
         """
         Save to file
@@ -339,6 +1115,44 @@ class Runner:
         except IndexError:
             self._print_error('Invalid command! Must be: S Name')
 
+    def execute_b(self, args):
+        """
+        Print the number of pixels and the bounding box of one color, or of all colors
+        :param args: Args used in this command
+        """
+        try:
+            # Colors are counted once, then kept updated for the rest of the session
+            self._data.enable_color_tracking()
+            self._track_colors = True
+            colors = [str(args[0])] if args else sorted(self._data.color_histogram())
+            for color in colors:
+                box = self._data.bounding_box(color)
+                box_text = ' '.join(str(value) for value in box) if box else '-'
+                self._print_output('{} {} {}'.format(color, self._data.color_count(color), box_text))
+        except AttributeError:
+            self._print_error('Invalid command! Must be initialized first.')
+        except ValueError as error:
+            self._print_error(str(error))
+
+    def execute_p(self, args):
+        """
+        Print a preview, or save it to file when a name is given
+        :param args: Args used in this command
+        """
+        try:
+            max_width = int(args[0])
+            max_height = int(args[1])
+            if len(args) > 2:
+                self._data.save_preview(str(args[2]), max_width, max_height)
+            else:
+                self._print_output(self._data.get_formatted_preview(max_width, max_height).rstrip('\n'))
+        except AttributeError:
+            self._print_error('Invalid command! Must be initialized first.')
+        except IndexError:
+            self._print_error('Invalid command! Must be: P Max_Width Max_Height [Name]')
+        except ValueError as error:
+            self._print_error(str(error))
+
     def execute(self, command, command_args):
         """
         Decides what command will be executed
@@ -357,7 +1171,292 @@ class Runner:
             self.execute(command, command_args)
 
 
+class _QuietRunner(Runner):
+    """Runner that does not print errors, used to replay commands already seen by the user"""
+    @staticmethod
+    def _print_error(error_message):
+        pass
+
+
+class Replay:
+    """
+    Replays a log of Runner commands, keeping checkpoints of the array to seek to any step quickly.
+        Seeking restores the nearest checkpoint before the step and replays only the commands after it.
+        Checkpoints are taken the first time a step is replayed, and share the lines that did not change
+        since the previous checkpoint, along with the fill limits set by T commands.
+        Commands with side effects (S, P, B and X) are skipped.
+    """
+    skipped_commands = ('S', 'P', 'B', 'X')
+
+    def __init__(self, lines, checkpoint_interval=1000, checkpoint_cost=None, fill_strategy_recursive=False):
+        """
+        Initialize Replay object
+        :param lines: Commands, one for each line, as typed in Runner
+        :param checkpoint_interval: Take a checkpoint every this number of commands
+        :param checkpoint_cost: If given, take a checkpoint when the commands since the last one wrote
+            at least this number of pixels, instead of using checkpoint_interval
+        :param fill_strategy_recursive: Strategy used to fill pixel area. True, will use recursive one.
+        """
+        if checkpoint_interval <= 0:
+            raise ValueError('Checkpoint interval must be a positive number')
+
+        self._commands = []
+        for line in lines:
+            command, *command_args = line.rstrip('\n').split(' ')
+            self._commands.append((command, command_args))
+
+        self._checkpoint_interval = checkpoint_interval
+        self._checkpoint_cost = checkpoint_cost
+        # Replayed arrays are only written and restored, color stats and preview levels would be wasted
+        self._runner = _QuietRunner(fill_strategy_recursive, track_colors=False, track_preview=False)
+        self._checkpoint_steps = [0]
+        self._checkpoints = [None]
+        self._checkpoint_fill_limits = [(self._runner.fill_max_pixels, self._runner.fill_timeout)]
+        self._position = 0
+        self._replayed_until = 0
+        self._cost_since_checkpoint = 0
+
+    def __len__(self):
+        return len(self._commands)
+
+    @property
+    def position(self):
+        return self._position
+
+    @property
+    def checkpoint_steps(self):
+        return list(self._checkpoint_steps)
+
+    def seek(self, step):
+        """
+        Bring the array to its state after the first step commands
+        :param step: Number of commands executed, from 0 to the number of commands
+        :return: The PixelArray object, or None if no I command was executed yet
+        """
+        if step < 0 or step > len(self):
+            raise ValueError('Step must be between 0 and the number of commands')
+
+        index = bisect_right(self._checkpoint_steps, step) - 1
+        checkpoint_step = self._checkpoint_steps[index]
+        if not checkpoint_step <= self._position <= step:
+            self._restore(self._checkpoints[index], self._checkpoint_fill_limits[index])
+            self._position = checkpoint_step
+
+        while self._position < step:
+            self._replay_next()
+        return self._runner._data
+
+    def _replay_next(self):
+        """Execute the command at the current position, taking a checkpoint when it is due"""
+        command, command_args = self._commands[self._position]
+        data = self._runner._data
+        pixels_written = data.pixels_written if data is not None else 0
+
+        if command.upper() not in self.skipped_commands:
+            try:
+                self._runner.execute(command, command_args)
+            except ValueError:
+                # Invalid values are verified before any pixel changes, the command is just ignored
+                pass
+        self._position += 1
+
+        if self._position <= self._replayed_until:
+            return
+        self._replayed_until = self._position
+
+        if self._runner._data is not data:
+            pixels_written = 0
+        if self._runner._data is not None:
+            self._cost_since_checkpoint += self._runner._data.pixels_written - pixels_written
+
+        if self._checkpoint_cost is None:
+            checkpoint_due = self._position % self._checkpoint_interval == 0
+        else:
+            checkpoint_due = self._cost_since_checkpoint >= self._checkpoint_cost
+        if checkpoint_due:
+            self._take_checkpoint()
+
+    def _take_checkpoint(self):
+        """Keep a compact copy of the array at the current position"""
+        data = self._runner._data
+        checkpoint = None
+        if data is not None:
+            previous = self._checkpoints[-1]
+            previous_rows = previous[1] if previous is not None and previous[0] == data.number_of_cols else ()
+            rows = []
+            for index, row in enumerate(data.data):
+                row = tuple(row)
+                if index < len(previous_rows) and previous_rows[index] == row:
+                    row = previous_rows[index]
+                rows.append(row)
+            checkpoint = (data.number_of_cols, tuple(rows))
+
+        self._checkpoint_steps.append(self._position)
+        self._checkpoints.append(checkpoint)
+        self._checkpoint_fill_limits.append((self._runner.fill_max_pixels, self._runner.fill_timeout))
+        self._cost_since_checkpoint = 0
+
+    def _restore(self, checkpoint, fill_limits):
+        """
+        Bring the array back to a checkpoint
+        :param checkpoint: Checkpoint taken by _take_checkpoint
+        :param fill_limits: Pair of fill_max_pixels and fill_timeout at the checkpoint
+        """
+        self._runner.fill_max_pixels, self._runner.fill_timeout = fill_limits
+        if checkpoint is None:
+            self._runner._data = None
+            return
+
+        number_of_cols, rows = checkpoint
+        self._runner._data = self._runner._new_pixelarray(number_of_cols, len(rows))
+        self._runner._data.restore(rows)
+
+
+class StreamingRunner:
+    """
+    Runs command scripts made only of I, C, L, V, H, K and S commands without keeping the array in memory.
+        Each S sweeps the shapes drawn so far line by line, writing the file as each line is ready,
+        so memory grows with the width and the number of shapes instead of the size of the array.
+        Scripts reading pixels (F, P, B), or with commands that Runner would report as errors,
+        are run by Runner instead.
+    """
+    def __init__(self, fill_strategy_recursive=False):
+        """
+        Initialize StreamingRunner object
+        :param fill_strategy_recursive: Strategy used to fill pixel area, used when falling back to Runner.
+        """
+        self._fill_strategy_recursive = fill_strategy_recursive
+
+    @staticmethod
+    def _parse(lines):
+        """
+        Turn a script into a list of streaming operations
+        :param lines: Commands, one for each line, as typed in Runner
+        :return: List of operations, or None if the script can not be streamed
+        """
+        operations = []
+        number_of_cols = number_of_rows = None
+
+        def verify(x, y):
+            if not (0 < x <= number_of_cols and 0 < y <= number_of_rows):
+                raise ValueError('Coordinates out of the array')
+
+        for line in lines:
+            command, *args = line.rstrip('\n').split(' ')
+            command = command.upper()
+            try:
+                if command == 'X':
+                    break
+                elif command == 'I':
+                    number_of_cols, number_of_rows = int(args[0]), int(args[1])
+                    if number_of_cols <= 0 or number_of_rows <= 0:
+                        return None
+                    operations.append(('I', number_of_cols, number_of_rows))
+                    continue
+                elif command not in ('C', 'L', 'V', 'H', 'K', 'S'):
+                    if command in ('F', 'P', 'B'):
+                        return None
+                    continue
+                elif number_of_cols is None:
+                    return None
+
+                if command == 'C':
+                    operations.append(('C',))
+                    continue
+                elif command == 'S':
+                    operations.append(('S', str(args[0])))
+                    continue
+                elif command == 'L':
+                    x1 = x2 = int(args[0])
+                    y1 = y2 = int(args[1])
+                    color = str(args[2])
+                elif command == 'V':
+                    x1 = x2 = int(args[0])
+                    y1, y2 = int(args[1]), int(args[2])
+                    color = str(args[3])
+                elif command == 'H':
+                    x1, x2 = int(args[0]), int(args[1])
+                    y1 = y2 = int(args[2])
+                    color = str(args[3])
+                else:
+                    x1, y1, x2, y2 = int(args[0]), int(args[1]), int(args[2]), int(args[3])
+                    color = str(args[4])
+
+                if x1 > x2 or y1 > y2:
+                    continue
+                verify(x1, y1)
+                verify(x2, y2)
+                operations.append(('shape', y1, y2, x1, x2, color))
+            except (IndexError, ValueError):
+                return None
+
+        return operations
+
+    def run_script(self, lines):
+        """
+        Run a script, streaming it when possible
+        :param lines: Commands, one for each line, as typed in Runner
+        :return: True if the script was streamed, False if it was run by Runner
+        """
+        lines = list(lines)
+        operations = self._parse(lines)
+        if operations is None:
+            runner = Runner(self._fill_strategy_recursive)
+            for line in lines:
+                command, *command_args = line.rstrip('\n').split(' ')
+                if command.upper() == 'X':
+                    break
+                runner.execute(command, command_args)
+            return False
+
+        shapes = []
+        for operation in operations:
+            if operation[0] == 'I':
+                number_of_cols, number_of_rows = operation[1], operation[2]
+                shapes = []
+            elif operation[0] == 'C':
+                shapes = []
+            elif operation[0] == 'S':
+                self._save(operation[1], number_of_cols, number_of_rows, shapes)
+            else:
+                # Shapes keep their command order, later ones are painted over earlier ones
+                shapes.append((operation[1], len(shapes)) + operation[2:])
+        return True
+
+    @staticmethod
+    def _save(name, number_of_cols, number_of_rows, shapes):
+        """
+        Save the array drawn by shapes to file, one line at a time
+        :param name: Name of the file
+        :param number_of_cols: Number of columns
+        :param number_of_rows: Number of rows
+        :param shapes: Tuples (y1, order, y2, x1, x2, color)
+        """
+        # Shapes still to start, the next one at the end, and shapes crossing the current line, in command order
+        pending = sorted(shapes, reverse=True)
+        active = []
+        file = open(name, 'w')
+        for y in range(1, number_of_rows + 1):
+            if active and any(shape[1] < y for shape in active):
+                active = [shape for shape in active if shape[1] >= y]
+            while pending and pending[-1][0] == y:
+                y1, order, y2, x1, x2, color = pending.pop()
+                insort(active, (order, y2, x1, x2, color))
+
+            row = ['0'] * number_of_cols
+            for order, y2, x1, x2, color in active:
+                row[x1-1:x2] = [color] * (x2 - x1 + 1)
+            file.write(''.join(row) + '\n')
+        file.close()
+
+
 if __name__ == '__main__':
-    Runner().run()
+    import sys
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as script:
+            StreamingRunner().run_script(script)
+    else:
+        Runner().run()
 
 
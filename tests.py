@@ -1,6 +1,31 @@
 from unittest import TestCase, skip
-from unittest.mock import MagicMock
-from pixelarray import PixelArray, Runner
+from unittest.mock import ANY, MagicMock, patch
+from pixelarray import FillInterrupted, PixelArray, Replay, Runner, StreamingRunner, _FillGuard, _PreviewPyramid
+
+
+def random_writes(obj, seed, number_of_writes=200):
+    """
+    Apply random writes to a PixelArray, yielding after each one
+    :param obj: The PixelArray object
+    :param seed: Seed of the random generator
+    :param number_of_writes: Number of writes
+    """
+    import random
+
+    generator = random.Random(seed)
+    for time in range(number_of_writes):
+        x1, x2 = sorted(generator.randint(1, obj.number_of_cols) for i in range(2))
+        y1, y2 = sorted(generator.randint(1, obj.number_of_rows) for i in range(2))
+        color = generator.choice('ABC')
+        generator.choice([
+            lambda: obj.colorize(x1, y1, color),
+            lambda: obj.draw_vertical_segment(x1, y1, y2, color),
+            lambda: obj.draw_horizontal_segment(x1, x2, y1, color),
+            lambda: obj.draw_rectangle(x1, y1, x2, y2, color),
+            lambda: obj.fill_region(x1, y1, color),
+            lambda: obj.clear() if generator.random() < 0.1 else None,
+        ])()
+        yield
 
 
 class PixelArrayTestCase(TestCase):
@@ -135,6 +160,12 @@ class PixelArrayTestCase(TestCase):
         obj.draw_rectangle(1, 3, 2, 6, 'R')
         self.assertEqual(obj.get_formatted_data(), expected)
 
+    def test_draw_rectangle_out_of_array_must_not_change_data(self):
+        obj = PixelArray(5, 5)
+        self.assertRaises(ValueError, obj.draw_rectangle, 2, 2, 6, 3, 'X')
+        self.assertRaises(ValueError, obj.draw_vertical_segment, 2, 0, 3, 'X')
+        self.assertEqual(obj.get_formatted_data(), '00000\n' * 5)
+
     def test_verify_coordinates_method(self):
         obj = PixelArray(2, 2)
         self.assertRaises(ValueError, obj._verify_coordinates, x=0, y=1)
@@ -185,7 +216,658 @@ class PixelArrayTestCase(TestCase):
         os.remove(name)
         self.assertEqual(file_text, expected)
 
+    def test_restore_must_replace_data_and_tracking(self):
+        expected, obj = self._get_pixelarray_and_expected()
+        restored = PixelArray(10, 9, track_colors=True, track_preview=True)
+        restored.restore(obj.snapshot())
+        self.assertEqual(restored.get_formatted_data(), expected)
+        obj.enable_color_tracking()
+        self.assertEqual(restored.color_histogram(), obj.color_histogram())
+        self.assertEqual(restored.bounding_box('J'), (2, 7, 8, 8))
+        self.assertEqual(restored.get_formatted_preview(5, 5), 'KK000\nR0000\nR0000\n0JJJ0\n00000\n')
+
+    def test_restore_zero_width_array(self):
+        obj = PixelArray(0, 3, track_colors=True)
+        obj.restore([[], [], []])
+        self.assertEqual(obj.color_histogram(), {})
+        self.assertEqual(obj.get_formatted_data(), '\n' * 3)
+        obj = PixelArray(0, 3, track_preview=True)
+        obj.restore([[], [], []])
+        self.assertEqual(obj.get_formatted_preview(5, 5), '\n' * 3)
+
+    def test_restore_must_verify_size(self):
+        obj = PixelArray(3, 2)
+        self.assertRaises(ValueError, obj.restore, [['0', '0', '0']])
+        self.assertRaises(ValueError, obj.restore, [['0', '0'], ['0', '0']])
+
+    def test_pixels_written(self):
+        obj = PixelArray(5, 4)
+        self.assertEqual(obj.pixels_written, 20)
+        obj.draw_rectangle(1, 1, 2, 2, 'X')
+        obj.draw_horizontal_segment(1, 5, 4, 'Y')
+        obj.colorize(5, 1, 'Z')
+        self.assertEqual(obj.pixels_written, 30)
+
+    def test_snapshot_must_return_copy_of_data(self):
+        obj = PixelArray(3, 2)
+        snapshot = obj.snapshot()
+        obj.colorize(1, 1, 'X')
+        self.assertEqual(snapshot, [['0', '0', '0'], ['0', '0', '0']])
+        self.assertEqual(obj.snapshot(), obj.data)
+
+
+class ThreadSafePixelArrayTestCase(TestCase):
+    @staticmethod
+    def _run_threads(target, number_of_threads):
+        from threading import Thread
+
+        threads = [Thread(target=target, args=(index,)) for index in range(number_of_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_must_not_create_locks_by_default(self):
+        obj = PixelArray(5, 5)
+        self.assertFalse(obj.thread_safe)
+        self.assertIsNone(obj._locks)
+
+    def test_must_share_no_op_lock_when_not_thread_safe(self):
+        obj, other = PixelArray(5, 5), PixelArray(3, 3)
+        self.assertIs(obj._lock_rows(1, 5), other._lock_all())
+
+    def test_must_create_one_lock_per_stripe(self):
+        obj = PixelArray(5, 10, thread_safe=True, rows_per_lock=4)
+        self.assertTrue(obj.thread_safe)
+        self.assertEqual(len(obj._locks), 3)
+
+    def test_rows_per_lock_must_be_positive(self):
+        self.assertRaises(ValueError, PixelArray, 5, 5, thread_safe=True, rows_per_lock=0)
+        self.assertFalse(PixelArray(5, 5, rows_per_lock=0).thread_safe)
+
+    def test_concurrent_band_writers(self):
+        number_of_threads, band_height, cols = 8, 5, 20
+        obj = PixelArray(cols, number_of_threads * band_height, thread_safe=True, rows_per_lock=3)
+
+        def draw_band(index):
+            color = str(index)
+            y1 = index * band_height + 1
+            y2 = y1 + band_height - 1
+            for repeat in range(20):
+                obj.draw_rectangle(1, y1, cols, y2, 'X')
+                obj.draw_horizontal_segment(1, cols, y1, color)
+                for x in range(1, cols + 1):
+                    obj.draw_vertical_segment(x, y1, y2, color)
+
+        self._run_threads(draw_band, number_of_threads)
+
+        expected = ''.join(str(index) * cols + '\n'
+                           for index in range(number_of_threads)
+                           for row in range(band_height))
+        self.assertEqual(obj.get_formatted_data(), expected)
+
+    def test_concurrent_overlapping_writers(self):
+        number_of_threads, size = 6, 12
+        obj = PixelArray(size, size, thread_safe=True, rows_per_lock=2)
+
+        def draw_all(index):
+            for repeat in range(30):
+                obj.draw_rectangle(1, 1, size, size, str(index))
+
+        self._run_threads(draw_all, number_of_threads)
+
+        # Every rectangle is written while holding all its stripes, so the last one wins entirely
+        colors = set(color for row in obj.data for color in row)
+        self.assertEqual(len(colors), 1)
+
+    def test_fill_region_must_see_consistent_view(self):
+        number_of_threads, size = 4, 16
+        obj = PixelArray(size, size, thread_safe=True, rows_per_lock=2)
+        snapshots = []
+
+        def writer_or_filler(index):
+            for repeat in range(20):
+                if index % 2:
+                    obj.draw_rectangle(1, 1, size, size, 'A' if repeat % 2 else 'B')
+                else:
+                    obj.fill_region(1, 1, str(index) + str(repeat % 2))
+                    snapshots.append(obj.snapshot())
+
+        self._run_threads(writer_or_filler, number_of_threads)
+
+        # Whole array is always one region, so a fill never leaves mixed colors behind
+        for snapshot in snapshots:
+            with self.subTest():
+                self.assertEqual(len(set(color for row in snapshot for color in row)), 1)
+
+
+class BoundedFillTestCase(TestCase):
+    fill_strategy_recursive = False
+
+    def _new(self, number_of_cols=10, number_of_rows=10):
+        obj = PixelArray(number_of_cols, number_of_rows, fill_strategy_recursive=self.fill_strategy_recursive)
+        obj.draw_vertical_segment(5, 1, number_of_rows, 'W')
+        return obj
+
+    def test_fill_within_budget_must_fill_whole_region(self):
+        obj = self._new()
+        obj.fill_region(1, 1, 'K', max_pixels=40)
+        self.assertEqual(obj.get_formatted_data(), 'KKKKW00000\n' * 10)
+
+    def test_fill_over_budget_must_roll_back(self):
+        obj = self._new()
+        with self.assertRaises(FillInterrupted) as context:
+            obj.fill_region(1, 1, 'K', max_pixels=39)
+        self.assertEqual(context.exception.reason, 'budget')
+        self.assertEqual(context.exception.filled_pixels, 39)
+        self.assertTrue(context.exception.rolled_back)
+        self.assertEqual(obj.get_formatted_data(), '0000W00000\n' * 10)
+
+    def test_fill_over_budget_without_rollback_must_leave_partial_fill(self):
+        obj = self._new()
+        with self.assertRaises(FillInterrupted) as context:
+            obj.fill_region(1, 1, 'K', max_pixels=15, rollback=False)
+        self.assertFalse(context.exception.rolled_back)
+        self.assertEqual(obj.get_formatted_data().count('K'), 15)
+
+    def test_cancelled_fill_must_stop(self):
+        from threading import Event
+
+        cancel = Event()
+        cancel.set()
+        obj = self._new()
+        with self.assertRaises(FillInterrupted) as context:
+            obj.fill_region(1, 1, 'K', cancel=cancel)
+        self.assertEqual(context.exception.reason, 'cancelled')
+        self.assertEqual(obj.get_formatted_data(), '0000W00000\n' * 10)
+
+    def test_fill_past_deadline_must_stop(self):
+        obj = self._new()
+        with self.assertRaises(FillInterrupted) as context:
+            obj.fill_region(1, 1, 'K', timeout=-1)
+        self.assertEqual(context.exception.reason, 'deadline')
+        self.assertEqual(str(context.exception), 'Fill stopped by deadline after 0 pixels, changes were rolled back.')
+
+    def test_fill_must_report_progress(self):
+        progress = MagicMock()
+        obj = self._new()
+        obj.fill_region(1, 1, 'K', progress=progress)
+        progress.assert_called_with(40)
+
+    def test_fill_with_same_color_must_do_nothing(self):
+        obj = self._new()
+        obj.fill_region(1, 1, '0', max_pixels=1)
+        self.assertEqual(obj.get_formatted_data(), '0000W00000\n' * 10)
+
+    def test_fill_must_restore_recursion_limit(self):
+        import sys
+
+        recursion_limit = sys.getrecursionlimit()
+        obj = self._new()
+        self.assertRaises(FillInterrupted, obj.fill_region, 1, 1, 'K', max_pixels=5)
+        self.assertEqual(sys.getrecursionlimit(), recursion_limit)
+
+    def test_bounded_fill_from_deep_stack(self):
+        def fill_from_depth(depth):
+            if depth:
+                return fill_from_depth(depth - 1)
+            obj = self._new()
+            self.assertRaises(FillInterrupted, obj.fill_region, 1, 1, 'K', max_pixels=5)
+            obj.fill_region(1, 1, 'K', max_pixels=40)
+            return obj
+
+        obj = fill_from_depth(150)
+        self.assertEqual(obj.get_formatted_data(), 'KKKKW00000\n' * 10)
+
+    def test_runner_bounded_fill_from_deep_stack(self):
+        def fill_from_depth(depth):
+            if depth:
+                return fill_from_depth(depth - 1)
+            runner.execute_f(['1', '1', 'K'])
+
+        runner = Runner(fill_strategy_recursive=self.fill_strategy_recursive, fill_max_pixels=50)
+        runner.execute_i(['5', '5'])
+        fill_from_depth(150)
+        self.assertEqual(runner._data.get_formatted_data(), 'KKKKK\n' * 5)
+
+    def test_large_fill_must_not_use_recursion(self):
+        obj = PixelArray(20, 20, fill_strategy_recursive=True)
+        obj.recursive_fill_limit = 100
+        obj._fill_recursive = MagicMock()
+        obj.fill_region(1, 1, 'K')
+        obj._fill_recursive.assert_not_called()
+        self.assertEqual(obj.get_formatted_data(), ('K' * 20 + '\n') * 20)
+        obj.fill_region(1, 1, 'J', max_pixels=100)
+        obj._fill_recursive.assert_called_once_with(1, 1, 'K', 'J', ANY)
+
+    def test_runner_must_print_error_when_fill_is_interrupted(self):
+        runner = Runner(fill_strategy_recursive=self.fill_strategy_recursive, fill_max_pixels=3)
+        runner.execute_i(['4', '4'])
+        runner._print_error = MagicMock()
+        runner.execute_f(['1', '1', 'K'])
+        runner._print_error.assert_called_once_with('Fill stopped by pixel budget after 3 pixels, changes were rolled back.')
+        self.assertEqual(runner._data.get_formatted_data(), '0000\n' * 4)
+
+    def test_runner_cancel_before_fill_must_not_be_lost(self):
+        runner = Runner(fill_strategy_recursive=self.fill_strategy_recursive)
+        runner.execute_i(['4', '4'])
+        runner._print_error = MagicMock()
+        runner.cancel_fill()
+        runner.execute_f(['1', '1', 'K'])
+        runner._print_error.assert_called_once_with('Fill stopped by cancellation after 0 pixels, region was partially filled.')
+        runner.execute_f(['1', '1', 'K'])
+        self.assertEqual(runner._data.get_formatted_data(), 'KKKK\n' * 4)
+
+    def test_runner_cancel_fill_from_another_thread(self):
+        from threading import Event, Thread
+
+        runner = Runner(fill_strategy_recursive=self.fill_strategy_recursive, fill_timeout=60)
+        runner.execute_i(['50', '50'])
+        runner._print_error = MagicMock()
+        started = Event()
+        colorize = runner._data._colorize
+
+        def colorize_and_wait(x, y, color):
+            # The first pixel waits for the cancellation, so it always arrives during the fill
+            if not started.is_set():
+                started.set()
+                runner._fill_cancel.wait(5)
+            colorize(x, y, color)
+
+        runner._data._colorize = colorize_and_wait
+        thread = Thread(target=runner.execute_f, args=(['1', '1', 'K'],))
+        thread.start()
+        self.assertTrue(started.wait(5))
+        runner.cancel_fill()
+        thread.join(5)
+
+        runner._print_error.assert_called_once_with(
+            'Fill stopped by cancellation after 1024 pixels, changes were rolled back.')
+        self.assertEqual(runner._data.get_formatted_data(), ('0' * 50 + '\n') * 50)
+        self.assertFalse(runner._fill_cancel.is_set())
+
+    def test_runner_unbounded_fill_must_not_record_pixels(self):
+        runner = Runner(fill_strategy_recursive=self.fill_strategy_recursive)
+        runner.execute_i(['4', '4'])
+        with patch('pixelarray._FillGuard', wraps=_FillGuard) as fill_guard:
+            runner.execute_f(['1', '1', 'K'])
+            runner.execute_t(['100', '-'])
+            runner.execute_f(['1', '1', 'J'])
+        self.assertEqual(fill_guard.call_args_list[0][1]['record'], False)
+        self.assertEqual(fill_guard.call_args_list[1][1]['record'], True)
+        self.assertEqual(runner._data.get_formatted_data(), 'JJJJ\n' * 4)
+
+    def test_runner_t_command_must_set_fill_limits(self):
+        runner = Runner(fill_strategy_recursive=self.fill_strategy_recursive)
+        runner.execute_t(['3', '0.5'])
+        self.assertEqual((runner.fill_max_pixels, runner.fill_timeout), (3, 0.5))
+        runner.execute_i(['4', '4'])
+        runner._print_error = MagicMock()
+        runner.execute_f(['1', '1', 'K'])
+        runner._print_error.assert_called_once_with('Fill stopped by pixel budget after 3 pixels, changes were rolled back.')
+        runner.execute_t(['-', '-'])
+        self.assertEqual((runner.fill_max_pixels, runner.fill_timeout), (None, None))
+
+
+class BoundedFillRecursiveTestCase(BoundedFillTestCase):
+    fill_strategy_recursive = True
+
+
+class ColorStatsTestCase(TestCase):
+    @staticmethod
+    def _scan_histogram_and_boxes(obj):
+        histogram, boxes = {}, {}
+        for y, row in enumerate(obj.data, 1):
+            for x, color in enumerate(row, 1):
+                histogram[color] = histogram.get(color, 0) + 1
+                x1, y1, x2, y2 = boxes.get(color, (x, y, x, y))
+                boxes[color] = (min(x1, x), min(y1, y), max(x2, x), max(y2, y))
+        return histogram, boxes
+
+    def assertStatsMatchData(self, obj):
+        histogram, boxes = self._scan_histogram_and_boxes(obj)
+        self.assertEqual(obj.color_histogram(), histogram)
+        for color, box in boxes.items():
+            self.assertEqual(obj.color_count(color), histogram[color])
+            self.assertEqual(obj.bounding_box(color), box)
+
+    def test_initial_stats(self):
+        obj = PixelArray(4, 3, track_colors=True)
+        self.assertEqual(obj.color_histogram(), {'0': 12})
+        self.assertEqual(obj.bounding_box('0'), (1, 1, 4, 3))
+        self.assertEqual(obj.color_count('X'), 0)
+        self.assertIsNone(obj.bounding_box('X'))
+
+    def test_stats_must_follow_every_write(self):
+        obj = PixelArray(10, 9, track_colors=True)
+        obj.draw_rectangle(1, 1, 4, 2, 'X')
+        self.assertStatsMatchData(obj)
+        obj.draw_vertical_segment(5, 1, 9, 'E')
+        self.assertStatsMatchData(obj)
+        obj.draw_horizontal_segment(1, 10, 5, 'R')
+        self.assertStatsMatchData(obj)
+        obj.colorize(10, 9, 'A')
+        self.assertStatsMatchData(obj)
+        obj.fill_region(1, 9, 'J')
+        self.assertStatsMatchData(obj)
+        obj.draw_rectangle(1, 1, 10, 4, 'J')
+        self.assertStatsMatchData(obj)
+        obj.clear()
+        self.assertStatsMatchData(obj)
+
+    def test_vertical_segments_must_keep_stats(self):
+        obj = PixelArray(4, 6, track_colors=True)
+        obj.draw_horizontal_segment(1, 4, 2, 'X')
+        obj.colorize(2, 5, 'Y')
+        for x, y1, y2, color in [(2, 1, 6, 'E'), (2, 2, 5, 'E'), (2, 1, 6, 'X'), (3, 2, 2, 'Y'), (1, 1, 6, 'Y')]:
+            with self.subTest(x=x, y1=y1, y2=y2, color=color):
+                obj.draw_vertical_segment(x, y1, y2, color)
+                self.assertStatsMatchData(obj)
+        self.assertIsNone(obj.bounding_box('E'))
+
+    def test_bounding_box_must_shrink_when_pixels_are_overwritten(self):
+        obj = PixelArray(10, 10, track_colors=True)
+        obj.colorize(1, 1, 'X')
+        obj.colorize(10, 10, 'X')
+        obj.colorize(5, 6, 'X')
+        self.assertEqual(obj.bounding_box('X'), (1, 1, 10, 10))
+        obj.colorize(1, 1, '0')
+        obj.colorize(10, 10, '0')
+        self.assertEqual(obj.bounding_box('X'), (5, 6, 5, 6))
+        obj.colorize(5, 6, '0')
+        self.assertIsNone(obj.bounding_box('X'))
+        self.assertEqual(obj.color_histogram(), {'0': 100})
+
+    def test_random_writes_must_keep_stats(self):
+        obj = PixelArray(12, 8, track_colors=True)
+        for write in random_writes(obj, seed=28):
+            self.assertStatsMatchData(obj)
+
+    def test_untracked_colors_must_raise_value_error(self):
+        obj = PixelArray(2, 2)
+        obj.colorize(1, 1, 'X')
+        self.assertRaises(ValueError, obj.color_histogram)
+        self.assertRaises(ValueError, obj.bounding_box, 'X')
+
+    def test_colors_must_not_be_tracked_by_default(self):
+        self.assertIsNone(PixelArray(2, 2)._color_stats)
+        self.assertIsNone(Runner()._new_pixelarray(2, 2)._color_stats)
+
+    def test_enable_color_tracking_must_count_current_data(self):
+        obj = PixelArray(10, 9)
+        obj.draw_rectangle(1, 1, 4, 2, 'X')
+        obj.fill_region(10, 9, 'K')
+        obj.enable_color_tracking()
+        self.assertStatsMatchData(obj)
+        obj.draw_vertical_segment(2, 1, 9, 'E')
+        obj.clear()
+        self.assertStatsMatchData(obj)
+
+    def test_concurrent_writers_must_keep_stats(self):
+        from threading import Thread
+
+        obj = PixelArray(20, 40, thread_safe=True, rows_per_lock=5, track_colors=True)
+
+        def draw_band(index):
+            for repeat in range(20):
+                obj.draw_rectangle(1, index * 5 + 1, 20, index * 5 + 5, str(repeat % 3))
+
+        threads = [Thread(target=draw_band, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertStatsMatchData(obj)
+
+
+class PreviewTestCase(TestCase):
+    @staticmethod
+    def _get_pixelarray(track_preview):
+        obj = PixelArray(10, 9, track_preview=track_preview)
+        obj.draw_rectangle(1, 1, 4, 2, 'X')
+        obj.draw_rectangle(2, 7, 8, 8, 'E')
+        obj.draw_rectangle(1, 3, 2, 6, 'R')
+        obj.fill_region(10, 9, 'K')
+        return obj
+
+    def assertPreviewMatchesData(self, obj):
+        expected = _PreviewPyramid(obj.number_of_cols, obj.number_of_rows)
+        expected.update(obj.data, 1, 1, obj.number_of_cols, obj.number_of_rows)
+        self.assertEqual(obj._preview.levels, expected.levels)
+
+    def test_preview_levels(self):
+        obj = PixelArray(5, 3, track_preview=True)
+        self.assertEqual([len(level) for level in obj._preview.levels], [2, 1, 1])
+        self.assertEqual([len(level[0]) for level in obj._preview.levels], [3, 2, 1])
+
+    def test_preview_that_fits_must_return_data(self):
+        obj = self._get_pixelarray(track_preview=True)
+        self.assertEqual(obj.get_formatted_preview(10, 9), obj.get_formatted_data())
+
+    def test_majority_preview(self):
+        expected = 'XXKKK\n' \
+                   'RKKKK\n' \
+                   'RKKKK\n' \
+                   'KEEEK\n' \
+                   'KKKKK\n'
+
+        obj = self._get_pixelarray(track_preview=True)
+        self.assertEqual(obj.get_formatted_preview(5, 5), expected)
+        self.assertEqual(obj.get_formatted_preview(9, 9), expected)
+        self.assertEqual(obj.get_formatted_preview(1, 1), 'K\n')
+
+    def test_majority_and_top_left_preview_must_differ(self):
+        tracked, untracked = PixelArray(2, 2, track_preview=True), PixelArray(2, 2)
+        for obj in (tracked, untracked):
+            obj.colorize(1, 1, 'A')
+            obj.colorize(2, 1, 'B')
+        self.assertEqual(tracked.get_formatted_preview(1, 1), '0\n')
+        self.assertEqual(untracked.get_formatted_preview(1, 1), 'A\n')
+
+    def test_top_left_preview(self):
+        expected = 'XXKKK\n' \
+                   'RKKKK\n' \
+                   'RKKKK\n' \
+                   'KEEEK\n' \
+                   'KKKKK\n'
+
+        obj = self._get_pixelarray(track_preview=False)
+        self.assertIsNone(obj._preview)
+        self.assertEqual(obj.get_formatted_preview(5, 5), expected)
+        self.assertEqual(obj.get_formatted_preview(3, 3), 'XKK\nRKK\nKKK\n')
+
+    def test_preview_size_must_be_positive(self):
+        obj = PixelArray(2, 2)
+        self.assertRaises(ValueError, obj.get_formatted_preview, 0, 1)
+
+    def test_random_writes_must_keep_preview(self):
+        obj = PixelArray(13, 7, track_preview=True)
+        for write in random_writes(obj, seed=29):
+            self.assertPreviewMatchesData(obj)
+
+    def test_must_save_preview_to_file(self):
+        import os
+        obj = self._get_pixelarray(track_preview=True)
+        name = 'preview.bmp'
+        obj.save_preview(name, 3, 3)
+        with open(name) as file:
+            file_text = file.read()
+            file.close()
+        os.remove(name)
+        self.assertEqual(file_text, obj.get_formatted_preview(3, 3))
+
+
+class ReplayTestCase(TestCase):
+    lines = ['I 10 9', 'L 5 3 A', 'S replay.bmp', 'G 2 3 J', 'V 2 3 4 W', 'H 1 10 5 Z', 'F 3 3 J',
+             'K 2 7 8 8 E', 'L 11 1 A', 'F 9 9 R', 'C', 'L 1 1 B', 'I 2 2', 'L 2 2 C']
+
+    def _states(self):
+        runner = Runner()
+        states = [None]
+        for line in self.lines:
+            command, *command_args = line.split(' ')
+            if command.upper() != 'S':
+                try:
+                    runner.execute(command, command_args)
+                except ValueError:
+                    pass
+            states.append(runner._data.get_formatted_data() if runner._data else None)
+        return states
+
+    def assertSeek(self, replay, step, expected):
+        obj = replay.seek(step)
+        self.assertEqual(obj.get_formatted_data() if obj else None, expected)
+        self.assertEqual(replay.position, step)
+
+    def test_seek_forward_and_backward(self):
+        import os
+
+        states = self._states()
+        replay = Replay(self.lines, checkpoint_interval=3)
+        for step in list(range(len(self.lines) + 1)) + [9, 2, 14, 0, 7, 6, 13]:
+            with self.subTest(step=step):
+                self.assertSeek(replay, step, states[step])
+        self.assertEqual(replay.checkpoint_steps, [0, 3, 6, 9, 12])
+        self.assertFalse(os.path.exists('replay.bmp'))
+
+    def test_seek_must_restore_nearest_checkpoint(self):
+        replay = Replay(self.lines, checkpoint_interval=4)
+        replay.seek(14)
+        replay._runner.execute = MagicMock()
+        replay.seek(6)
+        self.assertEqual(replay._runner.execute.call_count, 2)
+
+    def test_seek_backward_must_restore_fill_limits(self):
+        lines = ['I 10 10', 'F 1 1 A', 'T 5 -', 'L 1 1 B']
+        replay = Replay(lines)
+        replay.seek(4)
+        self.assertSeek(replay, 2, 'AAAAAAAAAA\n' * 10)
+
+    def test_checkpoint_cost(self):
+        states = self._states()
+        replay = Replay(self.lines, checkpoint_cost=50)
+        for step in [14, 5, 10, 1]:
+            with self.subTest(step=step):
+                self.assertSeek(replay, step, states[step])
+        # I writes 90 pixels, then L, V, H and F write 50, then K and F write 40 and C writes 90
+        self.assertEqual(replay.checkpoint_steps, [0, 1, 7, 11])
+
+    def test_checkpoints_must_share_unchanged_rows(self):
+        replay = Replay(['I 3 3', 'L 1 1 A', 'L 1 3 B'], checkpoint_interval=1)
+        replay.seek(3)
+        first, second, third = [checkpoint[1] for checkpoint in replay._checkpoints[1:3] + replay._checkpoints[3:]]
+        self.assertIs(first[1], second[1])
+        self.assertIs(second[0], third[0])
+        self.assertIsNot(second[2], third[2])
+
+    def test_replayed_arrays_must_not_track(self):
+        replay = Replay(self.lines, checkpoint_interval=3)
+        for step in (14, 4):
+            obj = replay.seek(step)
+            self.assertIsNone(obj._color_stats)
+            self.assertIsNone(obj._preview)
+
+    def test_seek_zero_width_array(self):
+        replay = Replay(['I 0 3', 'L 1 1 A', 'C'], checkpoint_interval=1)
+        self.assertEqual(replay.seek(3).get_formatted_data(), '\n' * 3)
+        self.assertEqual(replay.seek(1).get_formatted_data(), '\n' * 3)
+
+    def test_seek_must_verify_step(self):
+        replay = Replay(self.lines)
+        self.assertRaises(ValueError, replay.seek, -1)
+        self.assertRaises(ValueError, replay.seek, len(self.lines) + 1)
+
+
+class StreamingRunnerTestCase(TestCase):
+    def setUp(self):
+        self.runner = StreamingRunner()
+
+    def tearDown(self):
+        import os
+        for name in ('stream.bmp', 'memory.bmp', 'first.bmp'):
+            if os.path.exists(name):
+                os.remove(name)
+
+    @staticmethod
+    def _read(name):
+        with open(name) as file:
+            return file.read()
 
+    def _run_in_memory(self, lines):
+        runner = Runner()
+        for line in lines:
+            command, *command_args = line.replace('stream.bmp', 'memory.bmp').split(' ')
+            if command.upper() == 'X':
+                break
+            runner.execute(command, command_args)
+        return self._read('memory.bmp')
+
+    def assertStreamed(self, lines):
+        self.assertTrue(self.runner.run_script(lines))
+        self.assertEqual(self._read('stream.bmp'), self._run_in_memory(lines))
+
+    def test_must_stream_fill_free_script(self):
+        lines = ['I 10 9', 'L 5 3 A', 'G 2 3 J', 'V 2 3 4 W', 'H 1 10 5 Z', 'K 2 7 8 8 E', 'k 3 3 1 1 Q',
+                 'S stream.bmp']
+        self.assertStreamed(lines)
+        self.assertEqual(self._read('stream.bmp'), '0000000000\n'
+                                                   '0000000000\n'
+                                                   '0W00A00000\n'
+                                                   '0W00000000\n'
+                                                   'ZZZZZZZZZZ\n'
+                                                   '0000000000\n'
+                                                   '0EEEEEEE00\n'
+                                                   '0EEEEEEE00\n'
+                                                   '0000000000\n')
+
+    def test_later_shapes_must_be_painted_over_earlier_ones(self):
+        self.assertStreamed(['I 6 6', 'K 1 2 6 5 A', 'V 3 1 6 B', 'H 1 6 4 C', 'K 2 4 5 6 D', 'L 3 4 E',
+                             'S stream.bmp'])
+
+    def test_must_save_each_s_command(self):
+        self.runner.run_script(['I 3 2', 'L 1 1 A', 'S first.bmp', 'C', 'L 3 2 B', 'S stream.bmp', 'X',
+                                'L 2 2 C', 'S stream.bmp'])
+        self.assertEqual(self._read('first.bmp'), 'A00\n000\n')
+        self.assertEqual(self._read('stream.bmp'), '000\n00B\n')
+
+    def test_random_scripts_must_match_in_memory_output(self):
+        import random
+
+        generator = random.Random(31)
+        for script in range(30):
+            cols, rows = generator.randint(1, 12), generator.randint(1, 12)
+            lines = ['I {} {}'.format(cols, rows)]
+            for command in range(generator.randint(0, 20)):
+                x1, x2 = generator.randint(1, cols), generator.randint(1, cols)
+                y1, y2 = generator.randint(1, rows), generator.randint(1, rows)
+                color = generator.choice('ABC')
+                lines.append(generator.choice([
+                    'L {} {} {}'.format(x1, y1, color),
+                    'V {} {} {} {}'.format(x1, y1, y2, color),
+                    'H {} {} {} {}'.format(x1, x2, y1, color),
+                    'K {} {} {} {} {}'.format(x1, y1, x2, y2, color),
+                ]))
+            lines.append('S stream.bmp')
+            with self.subTest(script=script):
+                self.assertStreamed(lines)
+
+    def test_must_fall_back_to_runner(self):
+        scripts = [
+            ['I 5 5', 'L 1 1 A', 'F 2 2 B', 'S stream.bmp'],
+            ['I 5 5', 'P 2 2', 'S stream.bmp'],
+            ['I 5 5', 'B', 'S stream.bmp'],
+            ['L 1 1 A', 'I 5 5', 'S stream.bmp'],
+            ['I 5 5', 'L 1', 'S stream.bmp'],
+        ]
+        for lines in scripts:
+            with self.subTest(lines=lines), patch('builtins.print'):
+                self.runner._save = MagicMock()
+                self.assertFalse(self.runner.run_script(lines))
+                self.runner._save.assert_not_called()
+                self.assertEqual(self._read('stream.bmp'), self._run_in_memory(lines))
+
+    def test_invalid_coordinates_must_fall_back_to_runner(self):
+        self.assertRaises(ValueError, self.runner.run_script, ['I 5 5', 'L 6 1 A', 'S stream.bmp'])
 
 
 class RunnerTestCase(TestCase):
@@ -244,6 +926,22 @@ class RunnerTestCase(TestCase):
         command, command_args = 's', ['test.bmp']
         self.assertExecute(command, command_args)
 
+    def test_execute_must_execute_b(self):
+        command, command_args = 'b', ['C']
+        self.assertExecute(command, command_args)
+
+    def test_execute_b_must_print_color_stats(self):
+        self.runner.execute_i(['3', '2'])
+        self.runner.execute_l(['2', '2', 'C'])
+        self.runner._print_output = MagicMock()
+        self.runner.execute_b([])
+        self.runner._print_output.assert_any_call('0 5 1 1 3 2')
+        self.runner._print_output.assert_called_with('C 1 2 2 2 2')
+        self.runner.execute_b(['Z'])
+        self.runner._print_output.assert_called_with('Z 0 -')
+        self.runner.execute_i(['2', '2'])
+        self.assertIsNotNone(self.runner._data._color_stats)
+
     def assertExecuteErrorMessage(self, command_method, command_args, error_message):
         # Mock the method
         method_old = self.runner._print_error
@@ -314,6 +1012,38 @@ class RunnerTestCase(TestCase):
         self.assertExecuteErrorMessage(self.runner.execute_s, [],
                                        'Invalid command! Must be: S Name')
 
+    def test_execute_must_execute_t(self):
+        command, command_args = 't', ['100', '-']
+        self.assertExecute(command, command_args)
+
+    def test_execute_t_must_print_error_message_if_command_format_error(self):
+        self.assertExecuteErrorMessage(self.runner.execute_t, ['100'],
+                                       'Invalid command! Must be: T Max_Pixels Max_Seconds')
+
+    def test_execute_must_execute_p(self):
+        command, command_args = 'p', ['80', '25']
+        self.assertExecute(command, command_args)
+
+    def test_execute_p_must_print_preview(self):
+        self.runner.execute_i(['4', '4'])
+        self.runner.execute_l(['1', '1', 'C'])
+        self.runner._print_output = MagicMock()
+        self.runner.execute_p(['2', '2'])
+        self.runner._print_output.assert_called_once_with('C0\n00')
+
+    def test_execute_p_must_print_error_message_if_command_format_error(self):
+        self.runner.execute_i(['2', '2'])
+        self.assertExecuteErrorMessage(self.runner.execute_p, ['2'],
+                                       'Invalid command! Must be: P Max_Width Max_Height [Name]')
+
+    def test_execute_p_must_print_error_message_if_not_initialized(self):
+        self.assertExecuteErrorMessage(self.runner.execute_p, ['2', '2'],
+                                       'Invalid command! Must be initialized first.')
+
+    def test_execute_b_must_print_error_message_if_not_initialized(self):
+        self.assertExecuteErrorMessage(self.runner.execute_b, [],
+                                       'Invalid command! Must be initialized first.')
+
     def test_execute_s_must_print_error_message_if_not_initialized(self):
         self.assertExecuteErrorMessage(self.runner.execute_s, ['1', '1', '1', '1', 'C'],
                                        'Invalid command! Must be initialized first.')
@@ -324,7 +1054,7 @@ class RunnerTestCase(TestCase):
         runner.execute_i(['2', '2'])
         runner._data._fill = MagicMock()
         runner.execute_f(['1', '2', 'K'])
-        runner._data._fill.assert_called_once_with(1, 2, '0', 'K')
+        runner._data._fill.assert_called_once_with(1, 2, '0', 'K', ANY)
 
     @staticmethod
     def test_runner_init_must_indicate_fill_strategy_recursive():
@@ -332,7 +1062,7 @@ class RunnerTestCase(TestCase):
         runner.execute_i(['2', '2'])
         runner._data._fill_recursive = MagicMock()
         runner.execute_f(['1', '2', 'K'])
-        runner._data._fill_recursive.assert_called_once_with(1, 2, '0', 'K')
+        runner._data._fill_recursive.assert_called_once_with(1, 2, '0', 'K', ANY)
 
 
 class RunnerTestCaseFloodFillRecursive(RunnerTestCase):